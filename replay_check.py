@@ -0,0 +1,84 @@
+# replay_check.py
+"""回放录制文件，并与录制时得到的结果逐条对比，用于回归检查
+
+用法:
+    python replay_check.py 北京市
+    python replay_check.py 北京市 --har 北京市_20261012_093000.har --keywords 数据,信息
+"""
+import argparse
+import asyncio
+import csv
+import os
+import sys
+from tools import execute_scraper, find_har_archive, har_result_paths, get_search_keywords
+
+
+def load_rows(filename):
+    """读取结果文件，返回 {机构名称: 行}，文件不存在时返回空字典"""
+    if not os.path.exists(filename):
+        return {}
+    with open(filename, newline="", encoding="utf-8-sig") as f:
+        return {row["name"]: row for row in csv.DictReader(f)}
+
+
+def diff_rows(baseline, current, ignore_fields=()):
+    """对比两份结果，返回差异说明列表"""
+    differences = []
+    for name in sorted(baseline.keys() - current.keys()):
+        differences.append(f"  - 回放中缺少: {name}")
+    for name in sorted(current.keys() - baseline.keys()):
+        differences.append(f"  + 回放中多出: {name}")
+    for name in sorted(baseline.keys() & current.keys()):
+        for field, value in baseline[name].items():
+            if field in ignore_fields:
+                continue
+            if current[name].get(field) != value:
+                differences.append(f"  * {name} 的 {field}: '{value}' -> '{current[name].get(field)}'")
+    return differences
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放录制文件并与录制结果对比")
+    parser.add_argument("province", help="省份名称")
+    parser.add_argument("--har", help="录制文件名或路径，默认使用该省份最新的录制")
+    parser.add_argument("--keywords", help="搜索关键词，逗号分隔，需与录制时一致")
+    args = parser.parse_args()
+
+    har_dir = os.getenv("SCRAPER_HAR_DIR", "har")
+    har_path = find_har_archive(har_dir, args.province, args.har)
+    if not har_path:
+        print(f"没有找到 {args.province} 的录制文件")
+        return 2
+
+    keywords = [k.strip() for k in args.keywords.split(",") if k.strip()] if args.keywords else get_search_keywords()
+    # 本次回放没有数据时不会生成结果文件，先删除上次回放的结果，避免对比到旧文件
+    for replay_file in har_result_paths(har_path, "replay"):
+        if os.path.exists(replay_file):
+            os.remove(replay_file)
+
+    print(f"回放录制文件: {har_path}")
+    print(asyncio.run(execute_scraper(args.province, keywords, har_mode="replay", har_file=har_path)))
+
+    has_difference = False
+    baseline_files = har_result_paths(har_path, "record")
+    if not os.path.exists(baseline_files[0]) and not os.path.exists(baseline_files[1]):
+        print(f"\n提示: 没有找到录制时的结果文件，录制时可能没有抓到数据: {baseline_files[0]}")
+    replay_files = har_result_paths(har_path, "replay")
+    # 失败原因、重试次数与网络时序有关，只比较是否失败
+    for label, baseline_file, replay_file, ignore_fields in (
+        ("有效数据", baseline_files[0], replay_files[0], ()),
+        ("失败数据", baseline_files[1], replay_files[1], ("attempts", "reason")),
+    ):
+        differences = diff_rows(load_rows(baseline_file), load_rows(replay_file), ignore_fields)
+        if differences:
+            has_difference = True
+            print(f"\n{label}与录制结果不一致（{len(differences)} 处）:")
+            print("\n".join(differences))
+        else:
+            print(f"\n{label}与录制结果一致")
+
+    return 1 if has_difference else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+# retry_queue.py
+import random
+import time
+
+
+class RetryQueue:
+    """详情页瞬时失败的延迟重试队列
+
+    详情页超时或报错时不再直接判为无效，而是放入队列，按指数退避延迟重试，
+    每条记录有独立的重试次数上限，超过上限后记为永久失败。
+    """
+
+    def __init__(self, max_retries=3, base_delay=2.0, max_delay=30.0, jitter=True):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.pending = []
+        self.failed = []
+
+    def backoff_delay(self, attempts: int) -> float:
+        """计算第 attempts 次重试前的等待时间（指数退避，jitter 为 True 时加随机抖动）"""
+        delay = min(self.base_delay * (2 ** attempts), self.max_delay)
+        if not self.jitter:
+            return delay
+        return delay + random.uniform(0, self.base_delay)
+
+    def add(self, record: dict, reason: str = "", attempts: int = 0):
+        """将失败的数据项加入队列
+
+        Args:
+            record: 数据项信息，至少包含 name 字段
+            reason: 本次失败原因
+            attempts: 已经重试过的次数
+        """
+        if attempts >= self.max_retries:
+            self.give_up(record, reason, attempts)
+            print(f"  {record.get('name', '')} 重试 {attempts} 次仍失败，记为永久失败")
+            return
+
+        self.pending.append({
+            "record": record,
+            "attempts": attempts,
+            "reason": reason,
+            "ready_at": time.monotonic() + self.backoff_delay(attempts),
+        })
+        print(f"  {record.get('name', '')} 加入重试队列（第 {attempts + 1} 次重试）")
+
+    def give_up(self, record: dict, reason: str, attempts: int = 0):
+        """不再重试，直接记为永久失败"""
+        self.failed.append({**record, "attempts": attempts, "reason": reason})
+
+    def has_pending(self) -> bool:
+        return bool(self.pending)
+
+    def pop_next(self):
+        """取出最早到期的一项，返回 (条目, 还需等待的秒数)"""
+        if not self.pending:
+            return None, 0.0
+        self.pending.sort(key=lambda entry: entry["ready_at"])
+        entry = self.pending.pop(0)
+        return entry, max(0.0, entry["ready_at"] - time.monotonic())
+
+    def fail_pending(self, reason: str):
+        """将队列中剩余的数据项全部记为永久失败"""
+        for entry in self.pending:
+            self.give_up(entry["record"], reason, entry["attempts"])
+        self.pending = []
@@ -2,14 +2,37 @@
 import asyncio
 import random
 from datetime import datetime
+from retry_queue import RetryQueue
+from stall_watchdog import Watchdog, StallError, RecoveryError, human_pause
+from session_store import (
+    STORAGE_STATE_PATH, load_storage_state, save_storage_state,
+    mark_session, on_verification_passed,
+)
+
+# 等待设置：fixed 不为 None 时每次等待固定秒数、重试不加随机抖动（回放模式用，保证多次运行可比）；
+# waited 累计主动等待的秒数，报告耗时时扣除
+wait_settings = {"fixed": None, "waited": 0.0}
+
+def use_fixed_waits(seconds):
+    """切换为固定等待时间，并固定随机数种子"""
+    wait_settings["fixed"] = seconds
+    random.seed(0)
+
+def use_human_waits():
+    """恢复随机的模拟人类等待时间"""
+    wait_settings["fixed"] = None
 
 async def human_wait(min_seconds=0.3, max_seconds=1.0):
     """模拟人类等待时间"""
-    wait_time = random.uniform(min_seconds, max_seconds)
+    if wait_settings["fixed"] is not None:
+        wait_time = wait_settings["fixed"]
+    else:
+        wait_time = random.uniform(min_seconds, max_seconds)
+    wait_settings["waited"] += wait_time
     await asyncio.sleep(wait_time)
 
 async def check_and_handle_slider(page):
-    """检查并处理滑块验证"""
+    """检查并处理滑块验证，验证通过后保存浏览器状态供后续会话复用"""
     try:
         # 检查是否有滑块验证
         slider_selectors = [
@@ -25,32 +48,77 @@ async def check_and_handle_slider(page):
             if await page.locator(selector).count() > 0:
                 print("检测到滑块验证，请人工完成滑块验证...")
                 print("请在浏览器中完成滑块验证，完成后回到控制台按回车继续...")
-                input("完成后按回车继续...")
+                # 在线程中等待输入，不阻塞事件循环；人工处理期间暂停看门狗计时
+                with human_pause():
+                    await asyncio.to_thread(input, "完成后按回车继续...")
                 # 给用户足够时间完成滑块
                 await human_wait(3, 5)
                 print("继续执行...")
+                
+                await on_verification_passed(page.context)
                 return True
         return False
     except Exception as e:
         print(f"检查滑块验证时出错: {e}")
         return False
 
-async def setup_browser(p):
-    """设置浏览器和页面配置"""
+async def setup_browser(p, storage_state_path=STORAGE_STATE_PATH, har_mode=None, har_path=None):
+    """设置浏览器和页面配置
+    
+    storage_state_path 指向已保存的浏览器状态，存在且有效时恢复到新上下文中，
+    传入 None 则始终使用全新上下文。
+    har_mode 为 "record" 时把本次运行的全部网络流量录制到 har_path（关闭上下文时写入），
+    为 "replay" 时所有请求都从 har_path 读取，不访问网络，也不读写浏览器状态
+    """
+    if har_mode not in (None, "record", "replay"):
+        raise ValueError(f"未知的 HAR 模式: {har_mode}")
+    if har_mode and not har_path:
+        raise ValueError("HAR 模式需要指定 har_path")
+    
     browser = await p.chromium.launch(
         headless=False, 
         slow_mo=100,
         timeout=60000
     )
     
+    if har_mode == "replay":
+        storage_state_path = None
+    
+    storage_state = load_storage_state(storage_state_path)
+    if storage_state:
+        print("恢复已保存的浏览器状态")
+    
+    context_options = {}
+    if har_mode == "record":
+        print(f"录制网络流量到: {har_path}")
+        context_options["record_har_path"] = har_path
+    
     context = await browser.new_context(
         viewport={"width": 1280, "height": 720},
         user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-        ignore_https_errors=True
+        ignore_https_errors=True,
+        storage_state=storage_state,
+        **context_options
     )
+    # 回放会话不计入滑块统计，避免影响恢复状态与全新会话的对比
+    if har_mode != "replay":
+        mark_session(context, storage_state_path, storage_state is not None)
+    
+    if har_mode == "replay":
+        # 录制中没有的请求直接中止，保证回放完全不访问网络
+        print(f"从录制文件回放: {har_path}")
+        await context.route_from_har(har_path, not_found="abort")
     
     page = await context.new_page()
     
+    # 检查初始页面是否有滑块，未出现滑块时也保存一次，刷新 cookies
+    if not await open_list_page(page):
+        await save_storage_state(context, storage_state_path)
+    
+    return browser, page
+
+async def open_list_page(page):
+    """打开（或重新打开）列表页，返回是否出现了滑块验证"""
     print("正在打开目标网站...")
     await page.goto("https://xxgs.chinanpo.mca.gov.cn/gsxt/newList", 
                   wait_until="domcontentloaded",
@@ -58,13 +126,18 @@ async def setup_browser(p):
     print("页面加载成功")
     await human_wait(2, 3)
     
-    # 检查初始页面是否有滑块
-    await check_and_handle_slider(page)
-    
-    return browser, page
+    return await check_and_handle_slider(page)
 
 async def set_filters(page, province, keyword):
     """设置网页筛选条件"""
+    await apply_common_filters(page, province)
+    await search_keyword(page, keyword)
+
+async def apply_common_filters(page, province):
+    """设置与关键词无关的筛选条件（组织状态、信用状况、组织类型、省份）
+    
+    多关键词抓取时只需设置一次，之后用 search_keyword 切换关键词
+    """
     print("正在设置筛选条件...")
     
     try:
@@ -86,12 +159,6 @@ async def set_filters(page, province, keyword):
         await social_group.click()
         await human_wait(0.5, 1)
 
-        # 输入搜索关键词
-        print(f"正在输入搜索关键词: {keyword}")
-        search_input = page.locator("input[placeholder='请输入社会组织名称或统一社会信用代码']")
-        await search_input.fill(keyword)
-        await human_wait(0.5, 1)
-
         # 点击空白区域关闭可能的下拉菜单
         print("点击空白区域关闭下拉菜单...")
         # 点击页面最左侧边缘（x=10, y=页面中间）
@@ -108,6 +175,74 @@ async def set_filters(page, province, keyword):
         province_option = page.locator(f"text={province}").first
         await province_option.click()
         await human_wait(0.5, 1)
+            
+    except Exception as e:
+        print(f"设置筛选条件时出错: {e}")
+        raise
+
+async def get_filter_fingerprint(page):
+    """读取当前筛选条件的状态指纹
+    
+    记录"正常""社会团体"等筛选项及其父元素的 class（选中状态体现在 class 上）和省份下拉框的文字，
+    切换省份前后对比，确认其他筛选条件没有被页面重置
+    """
+    return await page.evaluate("""() => {
+        const labels = ["正常", "社会团体"];
+        const filters = [];
+        for (const el of document.querySelectorAll("body *")) {
+            if (el.closest(".list_ul")) continue;
+            if (el.children.length === 0 && labels.includes(el.textContent.trim())) {
+                const parent = el.parentElement;
+                filters.push([el.textContent.trim(), el.className || "", parent ? parent.className || "" : ""]);
+            }
+        }
+        const selection = document.querySelector(".ant-select-selection");
+        return {filters: filters, province: selection ? selection.innerText.trim() : ""};
+    }""")
+
+async def switch_province(page, province, fingerprint):
+    """在已设置好筛选条件的列表页上只切换省份
+    
+    Args:
+        fingerprint: 设置筛选条件后通过 get_filter_fingerprint 得到的指纹
+    
+    Returns:
+        bool: 省份已切换且其他筛选条件仍然有效时返回 True，否则需要重新设置全部筛选条件
+    """
+    try:
+        print(f"切换省份: {province}")
+        province_dropdown = page.locator(".ant-select-selection").first
+        await province_dropdown.click()
+        await human_wait(0.5, 1)
+        
+        province_option = page.locator(f".ant-select-dropdown >> text={province}").first
+        await province_option.click()
+        await human_wait(0.5, 1)
+        
+        current = await get_filter_fingerprint(page)
+        if province not in current["province"]:
+            print(f"省份下拉框显示为 '{current['province']}'，切换失败")
+            return False
+        if current["filters"] != fingerprint["filters"]:
+            print("切换省份后其他筛选条件发生变化")
+            return False
+        return True
+    except Exception as e:
+        print(f"切换省份时出错: {e}")
+        return False
+
+async def search_keyword(page, keyword):
+    """替换搜索关键词并执行搜索，其他筛选条件保持不变"""
+    try:
+        # 输入搜索关键词
+        print(f"正在输入搜索关键词: {keyword}")
+        search_input = page.locator("input[placeholder='请输入社会组织名称或统一社会信用代码']")
+        await search_input.fill(keyword)
+        await human_wait(0.5, 1)
+
+        # 点击空白区域关闭输入框可能弹出的下拉菜单
+        await page.mouse.click(10, 300)
+        await human_wait(0.5, 1)
 
         # 执行搜索 - 关键操作1：点击检索之后检查滑块
         print("正在执行搜索...")
@@ -119,11 +254,138 @@ async def set_filters(page, province, keyword):
         await check_and_handle_slider(page)
             
     except Exception as e:
-        print(f"设置筛选条件时出错: {e}")
+        print(f"执行搜索时出错: {e}")
         raise
 
+# 详情页字段：输出字段名 -> 页面上的标签文字
+DETAIL_FIELDS = {
+    "credit_code": "统一社会信用代码",
+    "registration_authority": "登记管理机关",
+    "legal_representative": "法定代表人",
+    "business_scope": "业务范围",
+    "validity": "有效期",
+}
+
+# 输出文件的字段顺序
+OUTPUT_FIELDS = ["name", "province", "date"] + list(DETAIL_FIELDS)
+
+async def extract_detail_record(page):
+    """在一次 evaluate 调用中解析详情页的全部字段
+    
+    先收集页面上所有"标签：值"形式的内容（描述列表、表格、相邻元素、文本行），再按 DETAIL_FIELDS
+    取值；有效期没有标签时沿用原来的规则，取第一段含"至"和日期的文字
+    
+    Returns:
+        dict: DETAIL_FIELDS 中的每个字段，找不到的为空字符串
+    """
+    return await page.evaluate("""(labels) => {
+        const clean = (s) => (s || "").replace(/\\s+/g, " ").trim();
+        const pairs = {};
+        const add = (label, value) => {
+            label = clean(label).replace(/[：:]$/, "");
+            value = clean(value);
+            if (label && value && !(label in pairs)) pairs[label] = value;
+        };
+        const labelValue = /^([^：:]{2,15})[：:]\\s*(.+)$/;
+        
+        document.querySelectorAll(".ant-descriptions-item-label, th").forEach((el) => {
+            if (el.nextElementSibling) add(el.innerText, el.nextElementSibling.innerText);
+        });
+        for (const el of document.querySelectorAll("body *")) {
+            if (el.children.length > 0) continue;
+            const text = clean(el.innerText);
+            const match = text.match(labelValue);
+            if (match) add(match[1], match[2]);
+            else if (/[：:]$/.test(text) && el.nextElementSibling) add(text, el.nextElementSibling.innerText);
+        }
+        const lines = document.body.innerText.split("\\n").map(clean).filter(Boolean);
+        for (const line of lines) {
+            const match = line.match(labelValue);
+            if (match) add(match[1], match[2]);
+        }
+        
+        const record = {};
+        for (const [field, label] of Object.entries(labels)) {
+            const key = Object.keys(pairs).find((k) => k.includes(label));
+            record[field] = key ? pairs[key] : "";
+        }
+        
+        // 标签取到的不是"起始至截止"形式（如"有效期起始日期"或只有截止日期）时，
+        // 先按原来的规则找日期范围文字，找不到再保留标签取到的值
+        const looksLikeValidity = (text) => text.includes("至") && (text.includes("年") || text.includes("-"));
+        if (!looksLikeValidity(record.validity)) {
+            const candidates = [];
+            for (const selector of [".data_span", ".text_span", ".ant-descriptions-item-content", ".ant-card-body"]) {
+                Array.from(document.querySelectorAll(selector)).slice(0, 10)
+                    .forEach((el) => candidates.push(clean(el.innerText)));
+            }
+            candidates.push(...lines.slice(0, 20));
+            record.validity = candidates.find(looksLikeValidity) || record.validity;
+        }
+        return record;
+    }""", DETAIL_FIELDS)
+
+def parse_validity_end_date(validity_text):
+    """从"xxxx至yyyy"形式的有效期文字中解析截止日期，没有"至"时按单个截止日期解析，解析失败返回 None"""
+    if not validity_text:
+        return None
+    
+    if "至" in validity_text:
+        end_date_str = validity_text.split("至")[1].strip()
+    else:
+        end_date_str = validity_text.strip()
+    
+    # 清理日期字符串
+    end_date_str = end_date_str.split(' ')[0]
+    end_date_str = end_date_str.split('\n')[0]
+    
+    # 处理中文日期格式
+    if "年" in end_date_str and "月" in end_date_str and "日" in end_date_str:
+        end_date_str = end_date_str.replace("年", "-").replace("月", "-").replace("日", "")
+    elif "年" in end_date_str:
+        end_date_str = end_date_str.replace("年", "-")
+    
+    # 清理非数字和连字符的字符
+    end_date_str = ''.join(c for c in end_date_str if c.isdigit() or c == '-')
+    
+    # 确保日期格式正确
+    if len(end_date_str) < 8 or end_date_str.count('-') < 2:
+        return None
+    try:
+        return datetime.strptime(end_date_str, "%Y-%m-%d")
+    except:
+        try:
+            return datetime.strptime(end_date_str, "%Y-%m").replace(day=1)
+        except:
+            return None
+
+def is_record_valid(record):
+    """根据详情页记录中的有效期判断是否在2025-12-31之前有效"""
+    validity_text = record.get("validity", "")
+    if not validity_text:
+        print("  未找到有效期信息")
+        return False
+    
+    end_date = parse_validity_end_date(validity_text)
+    if end_date is None:
+        print(f"  无法解析有效期: {validity_text}")
+        return False
+    
+    is_valid = end_date >= datetime(2025, 12, 31)
+    print(f"  有效期至: {end_date.strftime('%Y-%m-%d')}, 是否有效: {is_valid}")
+    return is_valid
+
 async def check_item_validity(page, item_index):
-    """检查数据项是否在2025-12-31之前有效"""
+    """进入数据项详情页，提取完整的详情记录
+    
+    有效性由调用方通过 is_record_valid 根据返回的记录判断
+    
+    Returns:
+        dict: 详情页记录（字段见 DETAIL_FIELDS）；详情页加载失败等瞬时错误返回 None，由调用方决定是否重试
+    """
+    load_failed = False
+    # 记下列表页地址，出错时只有已经离开列表页才需要返回
+    list_url = page.url
     try:
         # 重新获取列表项，防止Stale元素引用
         list_items = page.locator(".list_li")
@@ -148,131 +410,128 @@ async def check_item_validity(page, item_index):
             if "detail" in current_url or "newList" not in current_url:
                 print(f"  成功跳转到详情页")
             
-            # 尝试多种选择器查找有效期信息
-            selectors_to_try = [
-                ".data_span.text",
-                ".data_span", 
-                ".text_span",
-                ".ant-descriptions-item-content",
-                ".ant-card-body"
-            ]
-            
-            validity_text = ""
-            for selector in selectors_to_try:
-                try:
-                    await page.wait_for_selector(selector, timeout=3000)
-                    elements = page.locator(selector)
-                    count = await elements.count()
-                    for i in range(min(count, 10)):
-                        element_text = await elements.nth(i).inner_text()
-                        element_text_clean = element_text.replace('\n', ' ').strip()
-                        if "至" in element_text_clean and ("年" in element_text_clean or "-" in element_text_clean):
-                            validity_text = element_text_clean
-                            print(f"  找到有效期信息: {validity_text}")
-                            break
-                    if validity_text:
-                        break
-                except:
-                    continue
-            
-            # 如果没找到，尝试通用文本搜索
-            if not validity_text:
-                print("  尝试通用文本搜索有效期信息...")
-                page_text = await page.inner_text("body")
-                lines = page_text.split('\n')
-                for line in lines[:20]:
-                    line_clean = line.strip()
-                    if "至" in line_clean and ("年" in line_clean or "-" in line_clean):
-                        validity_text = line_clean
-                        print(f"  从页面文本找到有效期: {validity_text}")
-                        break
-        
-        except Exception as load_error:
-            print(f"  详情页加载异常: {load_error}")
+            # 等待任一详情内容容器出现
             try:
-                page_text = await page.inner_text("body")
-                if "有效期" in page_text or "至" in page_text:
-                    lines = page_text.split('\n')
-                    for line in lines[:15]:
-                        line_clean = line.strip()
-                        if "至" in line_clean and ("年" in line_clean or "-" in line_clean):
-                            validity_text = line_clean
-                            break
-            except:
+                await page.wait_for_selector(
+                    ".data_span, .text_span, .ant-descriptions-item-content, .ant-card-body",
+                    timeout=3000
+                )
+            except Exception:
                 pass
+        except Exception as load_error:
+            print(f"  详情页加载异常: {load_error}")
+            load_failed = True
         
-        # 检查是否在2025-12-31之前有效
-        is_valid = False
-        if validity_text:
-            try:
-                if "至" in validity_text:
-                    parts = validity_text.split("至")
-                    if len(parts) >= 2:
-                        end_date_str = parts[1].strip()
-                        
-                        # 清理日期字符串
-                        end_date_str = end_date_str.split(' ')[0]
-                        end_date_str = end_date_str.split('\n')[0]
-                        
-                        # 处理中文日期格式
-                        if "年" in end_date_str and "月" in end_date_str and "日" in end_date_str:
-                            end_date_str = end_date_str.replace("年", "-").replace("月", "-").replace("日", "")
-                        elif "年" in end_date_str:
-                            end_date_str = end_date_str.replace("年", "-")
-                        
-                        # 清理非数字和连字符的字符
-                        end_date_str = ''.join(c for c in end_date_str if c.isdigit() or c == '-')
-                        
-                        # 确保日期格式正确
-                        if len(end_date_str) >= 8 and end_date_str.count('-') >= 2:
-                            try:
-                                end_date = datetime.strptime(end_date_str, "%Y-%m-%d")
-                            except:
-                                try:
-                                    end_date = datetime.strptime(end_date_str, "%Y-%m")
-                                    end_date = end_date.replace(day=1)
-                                except:
-                                    end_date = None
-                            
-                            if end_date:
-                                cutoff_date = datetime(2025, 12, 31)
-                                is_valid = end_date >= cutoff_date
-                                print(f"  有效期至: {end_date_str}, 是否有效: {is_valid}")
-                            else:
-                                is_valid = False
-                        else:
-                            is_valid = False
-                    else:
-                        is_valid = False
-                
-            except Exception as date_error:
-                print(f"  日期解析错误: {date_error}")
-                is_valid = False
-        else:
-            print("  未找到有效期信息")
-            is_valid = False
-        
-        # 返回列表页
-        print("  返回列表页...")
-        await page.go_back()
-        await human_wait(1, 2)
+        record = await extract_detail_record(page)
+        if record["validity"]:
+            print(f"  找到有效期信息: {record['validity']}")
         
-        # 确保返回到正确的页面
-        try:
-            await page.wait_for_selector(".list_ul", timeout=5000)
-        except:
-            print("  返回列表页后等待超时，但继续执行")
+        # 详情页没加载出来，无法判断有效性，交给重试队列
+        if load_failed and not record["validity"]:
+            print("  详情页加载失败，稍后重试")
+            await return_to_list(page, list_url)
+            return None
         
-        return is_valid
+        await return_to_list(page, list_url)
+        return record
         
     except Exception as e:
         print(f"  审核数据项时出错: {e}")
         try:
-            await page.go_back()
-            await human_wait(1, 2)
-        except:
+            # 点击标题等步骤失败时仍停留在列表页，此时不能后退，否则本页剩余数据和重试都会失败
+            if page.url != list_url:
+                await page.go_back()
+                await human_wait(1, 2)
+        except Exception:
             pass
-        return False
+        return None
+
+async def return_to_list(page, list_url=None):
+    """从详情页返回列表页；传入 list_url 且当前仍在该地址时不后退"""
+    if list_url and page.url == list_url:
+        return
+    
+    print("  返回列表页...")
+    await page.go_back()
+    await human_wait(1, 2)
+    
+    # 确保返回到正确的页面
+    try:
+        await page.wait_for_selector(".list_ul", timeout=5000)
+    except Exception:
+        print("  返回列表页后等待超时，但继续执行")
+
+async def find_item_index(page, name):
+    """在当前列表页中按机构名称查找数据项位置，找不到返回 None"""
+    list_items = page.locator(".list_li")
+    count = await list_items.count()
+    for i in range(count):
+        title = await list_items.nth(i).locator(".title_text").inner_text()
+        if title.replace('\n', '').strip() == name:
+            return i
+    return None
+
+async def drain_retry_queue(page, retry_queue, all_valid_data, seen_names=None, watchdog=None, recover=None):
+    """重试队列中的数据项，直到全部成功或用完重试次数
+    
+    传入 watchdog 时每次重试受单条记录时限约束，超出页面时限后剩余项全部记为失败；
+    单条记录超时后调用 recover 恢复列表页
+    """
+    if not retry_queue.has_pending():
+        return
+    
+    print(f"开始处理重试队列，共 {len(retry_queue.pending)} 项")
+    while retry_queue.has_pending():
+        if watchdog and watchdog.page_expired():
+            watchdog.report_stall("重试队列", page.url, watchdog.page_elapsed(), watchdog.page_timeout)
+            retry_queue.fail_pending("页面超时，未能重试")
+            return
+        
+        entry, wait_seconds = retry_queue.pop_next()
+        record = entry["record"]
+        attempts = entry["attempts"] + 1
+        
+        if wait_seconds > 0:
+            print(f"  等待 {wait_seconds:.1f} 秒后重试: {record['name']}")
+            wait_settings["waited"] += wait_seconds
+            await asyncio.sleep(wait_seconds)
+        
+        try:
+            await page.wait_for_selector(".list_ul", timeout=15000)
+            item_index = await find_item_index(page, record["name"])
+            if item_index is None:
+                # 重试只在本页进行，不在本页的数据项再等也找不到
+                retry_queue.give_up(record, "列表中未找到该数据项", attempts)
+                continue
+            
+            print(f"  重试第 {attempts} 次: {record['name']}")
+            if watchdog:
+                detail = await watchdog.run(
+                    check_item_validity(page, item_index), watchdog.record_timeout, "详情页审核（重试）", page
+                )
+            else:
+                detail = await check_item_validity(page, item_index)
+        except StallError:
+            detail = None
+            if recover:
+                await recover()
+        except RecoveryError:
+            raise
+        except Exception as e:
+            print(f"  重试时出错: {e}")
+            detail = None
+        
+        if detail is None:
+            retry_queue.add(record, "详情页加载失败", attempts)
+            continue
+        
+        if seen_names is not None:
+            seen_names.add(record["name"])
+        if is_record_valid(detail):
+            all_valid_data.append({**record, **detail})
+            print(f"  重试通过审核 - 累计有效: {len(all_valid_data)}")
+        else:
+            print(f"  重试后未通过审核")
 
 async def can_go_to_next_page(page):
     """检查是否可以翻到下一页"""
@@ -311,16 +570,82 @@ async def go_to_next_page(page):
         print(f"翻页失败: {e}")
         return False
 
-async def scrape_page(page, province):
-    """抓取所有页面的数据（支持翻页）"""
+async def jump_to_page(page, page_number):
+    """在当前检索结果中跳转到指定页码"""
+    if page_number <= 1:
+        return
+    
+    print(f"跳转到第 {page_number} 页...")
+    quick_jumper = page.locator(".ant-pagination-options-quick-jumper input")
+    page_item = page.locator(f".ant-pagination-item-{page_number}")
+    if await quick_jumper.count() > 0:
+        await quick_jumper.first.fill(str(page_number))
+        await quick_jumper.first.press("Enter")
+        await human_wait(3, 5)
+        await check_and_handle_slider(page)
+    elif await page_item.count() > 0:
+        await page_item.first.click()
+        await human_wait(3, 5)
+        await check_and_handle_slider(page)
+    else:
+        # 没有跳页控件时逐页翻过去
+        for _ in range(page_number - 1):
+            if not await go_to_next_page(page):
+                raise RuntimeError(f"无法翻到第 {page_number} 页")
+    
+    await page.wait_for_selector(".list_ul", timeout=15000)
+    active = page.locator(".ant-pagination-item-active")
+    if await active.count() > 0:
+        active_text = (await active.first.inner_text()).strip()
+        if active_text != str(page_number):
+            raise RuntimeError(f"跳页后当前页为 {active_text}，不是第 {page_number} 页")
+
+async def recover_list_page(page, province, keyword, page_number):
+    """重新打开列表页，恢复筛选条件和检索关键词，并回到指定页码"""
+    # 没有关键词时重新检索会得到未筛选的结果，不能在错误的结果集上继续抓取
+    if not keyword:
+        raise RecoveryError("缺少检索关键词，无法恢复列表页")
+    
+    print(f"[看门狗] 恢复列表页: {province} / '{keyword}' / 第 {page_number} 页")
+    try:
+        await open_list_page(page)
+        await set_filters(page, province, keyword)
+        await jump_to_page(page, page_number)
+    except Exception as e:
+        raise RecoveryError(f"恢复列表页失败: {e}") from e
+
+async def scrape_page(page, province, failed_items=None, seen_names=None, watchdog=None, keyword=None):
+    """抓取所有页面的数据（支持翻页）
+    
+    详情页瞬时失败的数据项会在每页结束时重试，仍失败的记录追加到 failed_items 中。
+    传入 seen_names 时跳过已经审核过的机构，并把本次审核过的机构名称加入其中，
+    用于多关键词抓取时去重。
+    watchdog 限制单条记录、单页和整个抓取过程的耗时，卡住时取消当前步骤，
+    重新打开列表页、用 keyword 重新检索并回到当前页码继续；不传 watchdog 时使用默认时限，
+    不传 keyword 时无法恢复，卡住即终止抓取。
+    抓取被提前终止时原因记录在 watchdog.interrupted 中
+    """
     all_valid_data = []
+    retry_queue = RetryQueue(jitter=wait_settings["fixed"] is None)
     current_page = 1
+    watchdog = watchdog or Watchdog()
+    watchdog.activate()
+    
+    async def recover():
+        await recover_list_page(page, province, keyword, current_page)
     
     print(f"开始抓取 {province} 的数据...")
     
     while True:
         print(f"正在处理第 {current_page} 页...")
         
+        if watchdog.run_expired():
+            watchdog.report_stall("整体抓取", page.url, watchdog.run_elapsed(), watchdog.run_timeout)
+            print("超过整体时限，停止抓取")
+            watchdog.interrupted = f"超过整体时限 {watchdog.run_timeout} 秒，停在第 {current_page} 页"
+            break
+        watchdog.start_page()
+        
         try:
             # 等待列表加载
             await page.wait_for_selector(".list_ul", timeout=15000)
@@ -360,31 +685,68 @@ async def scrape_page(page, province):
                         print(f"  审核第 {i+1} 项: {name}")
                         print(f"  成立时间: {established_text}")
                         
-                        # 审核数据项有效性
-                        is_valid = await check_item_validity(page, i)
+                        if seen_names is not None and name in seen_names:
+                            print(f"  已在其他关键词中审核过，跳过")
+                            continue
+                        
+                        record = {
+                            "name": name,
+                            "province": province,
+                            "date": established_text
+                        }
+                        
+                        # 本页已超时，剩余数据项不再进入详情页
+                        if watchdog.page_expired():
+                            retry_queue.give_up(record, "页面超时，未审核")
+                            continue
+                        
+                        # 进入详情页提取完整记录，再根据记录审核有效性
+                        try:
+                            detail = await watchdog.run(
+                                check_item_validity(page, i), watchdog.record_timeout, "详情页审核", page
+                            )
+                        except StallError:
+                            detail = None
+                            await recover()
                         
-                        if is_valid:
-                            all_valid_data.append({
-                                "name": name,
-                                "province": province,
-                                "date": established_text
-                            })
+                        if detail is None:
+                            retry_queue.add(record, "详情页加载失败")
+                        elif is_record_valid(detail):
+                            all_valid_data.append({**record, **detail})
                             print(f"  通过审核 - 累计有效: {len(all_valid_data)}")
                         else:
                             print(f"  未通过审核")
                         
+                        if detail is not None and seen_names is not None:
+                            seen_names.add(name)
+                        
                         await human_wait(0.3, 0.8)
                         
+                    except RecoveryError:
+                        raise
                     except Exception as e:
                         print(f"  处理第 {i+1} 条数据时出错: {e}")
                         continue
             
+            if watchdog.page_expired():
+                watchdog.report_stall(f"第 {current_page} 页", page.url, watchdog.page_elapsed(), watchdog.page_timeout)
+            
+            # 本页结束前处理重试队列（详情页返回后仍停留在本页）
+            await drain_retry_queue(page, retry_queue, all_valid_data, seen_names, watchdog, recover)
+            
             print(f"第 {current_page} 页完成，找到 {len(all_valid_data)} 条有效数据")
             
             # 检查是否可以翻到下一页
             if await can_go_to_next_page(page):
                 # 翻到下一页
-                if await go_to_next_page(page):
+                try:
+                    moved = await watchdog.run(go_to_next_page(page), watchdog.record_timeout, "翻页", page)
+                except StallError:
+                    # 翻页卡住时直接恢复到下一页
+                    current_page += 1
+                    await recover()
+                    continue
+                if moved:
                     current_page += 1
                     continue
                 else:
@@ -394,9 +756,22 @@ async def scrape_page(page, province):
                 print("没有下一页，抓取完成")
                 break
                 
+        except RecoveryError as e:
+            print(f"处理第 {current_page} 页时出错: {e}")
+            watchdog.interrupted = f"第 {current_page} 页{e}"
+            break
         except Exception as e:
             print(f"处理第 {current_page} 页时出错: {e}")
             break
     
+    watchdog.deactivate()
+    retry_queue.fail_pending("抓取中断，未能重试")
+    if failed_items is not None:
+        failed_items.extend(retry_queue.failed)
+    
     print(f"{province} 抓取完成，总共找到 {len(all_valid_data)} 条有效数据")
+    if retry_queue.failed:
+        print(f"{province} 有 {len(retry_queue.failed)} 条数据多次重试仍失败")
+    if watchdog.stalls:
+        print(f"{province} 共有 {len(watchdog.stalls)} 次步骤超时")
     return all_valid_data
\ No newline at end of file
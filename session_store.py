@@ -0,0 +1,121 @@
+# session_store.py
+import json
+import os
+import time
+import weakref
+
+# 浏览器登录状态（cookies、localStorage）保存位置，所有浏览器会话共用同一份
+STORAGE_STATE_PATH = "browser_storage_state.json"
+
+# 超过该时长的状态视为过期，不再恢复
+STORAGE_STATE_MAX_AGE = 6 * 60 * 60
+
+# 记录每个浏览器上下文使用的状态文件，以及是否恢复了已保存的状态
+_sessions = weakref.WeakKeyDictionary()
+
+# 滑块验证统计：按是否恢复状态分别记录会话数和遇到滑块的次数
+challenge_stats = {
+    "restored": {"sessions": 0, "challenges": 0},
+    "fresh": {"sessions": 0, "challenges": 0},
+}
+
+
+def rotate_storage_state(path=STORAGE_STATE_PATH):
+    """将失效的状态文件改名为 .stale，下次验证通过后会重新保存"""
+    if os.path.exists(path):
+        os.replace(path, path + ".stale")
+        print(f"浏览器状态已失效，已轮换: {path}")
+
+
+def load_storage_state(path=STORAGE_STATE_PATH, max_age=STORAGE_STATE_MAX_AGE):
+    """读取并校验已保存的浏览器状态
+
+    Returns:
+        dict: 可直接传给 new_context(storage_state=...) 的状态；没有可用状态时返回 None
+    """
+    if not path or not os.path.exists(path):
+        return None
+
+    age = time.time() - os.path.getmtime(path)
+    if age > max_age:
+        print(f"浏览器状态已保存 {age / 3600:.1f} 小时，超过有效期")
+        rotate_storage_state(path)
+        return None
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except Exception as e:
+        print(f"读取浏览器状态失败: {e}")
+        rotate_storage_state(path)
+        return None
+
+    cookies = state.get("cookies") if isinstance(state, dict) else None
+    if not isinstance(cookies, list) or not cookies:
+        print("浏览器状态中没有 cookies，忽略")
+        rotate_storage_state(path)
+        return None
+
+    # 过期时间为 -1 的是会话 cookie，其余全部过期则视为失效
+    now = time.time()
+    if all(0 < cookie.get("expires", -1) < now for cookie in cookies):
+        print("浏览器状态中的 cookies 已全部过期")
+        rotate_storage_state(path)
+        return None
+
+    return state
+
+
+async def save_storage_state(context, path=STORAGE_STATE_PATH):
+    """保存当前浏览器上下文的状态，先写临时文件再替换，避免多个会话同时写入时读到半个文件"""
+    if not path:
+        return
+    try:
+        state = await context.storage_state()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        print(f"浏览器状态已保存: {path}")
+    except Exception as e:
+        print(f"保存浏览器状态失败: {e}")
+
+
+def mark_session(context, path, restored: bool):
+    """登记新建的浏览器上下文使用的状态文件，以及是否恢复了已保存状态"""
+    _sessions[context] = {"path": path, "restored": restored}
+    challenge_stats["restored" if restored else "fresh"]["sessions"] += 1
+
+
+async def on_verification_passed(context):
+    """滑块验证通过后调用：记录统计，恢复的状态仍触发滑块则轮换，然后保存新状态"""
+    session = _sessions.get(context)
+    if session is None:
+        # 未登记的上下文（如回放会话）不计入统计，也不保存状态
+        return
+    challenge_stats["restored" if session["restored"] else "fresh"]["challenges"] += 1
+
+    if not session["path"]:
+        return
+    if session["restored"] and not session.get("rotated"):
+        rotate_storage_state(session["path"])
+        session["rotated"] = True
+    await save_storage_state(context, session["path"])
+
+
+def reset_challenge_stats():
+    """清零滑块验证统计，每次抓取开始时调用，报告中只统计本次运行"""
+    for stats in challenge_stats.values():
+        stats["sessions"] = 0
+        stats["challenges"] = 0
+
+
+def format_challenge_stats() -> str:
+    """生成滑块验证统计说明"""
+    parts = []
+    for key, label in (("restored", "恢复状态的会话"), ("fresh", "全新会话")):
+        stats = challenge_stats[key]
+        if stats["sessions"]:
+            rate = stats["challenges"] / stats["sessions"]
+            parts.append(f"{label} {stats['sessions']} 个，滑块 {stats['challenges']} 次（平均 {rate:.1f} 次/会话）")
+    return "滑块验证统计: " + "；".join(parts) if parts else ""
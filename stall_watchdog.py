@@ -0,0 +1,133 @@
+# stall_watchdog.py
+import asyncio
+import time
+from contextlib import contextmanager
+
+# 当前正在计时的看门狗，人工处理滑块时暂停它
+_active_watchdog = None
+
+
+class StallError(Exception):
+    """某个步骤超过时限被取消"""
+
+    def __init__(self, stage, url, elapsed, limit):
+        self.stage = stage
+        self.url = url
+        self.elapsed = elapsed
+        self.limit = limit
+        super().__init__(f"{stage} 超时: 已用 {elapsed:.1f} 秒（上限 {limit} 秒），URL: {url}")
+
+
+class RecoveryError(Exception):
+    """步骤超时后未能恢复到可继续抓取的页面"""
+
+
+class Watchdog:
+    """按时间片检查抓取步骤是否卡住
+
+    单条记录（进入详情页到返回列表页）、单个列表页、整个省份分别有时间上限。
+    人工处理滑块的时间不计入。
+    """
+
+    def __init__(self, record_timeout=90, page_timeout=900, run_timeout=4 * 60 * 60, tick=0.5, cancel_grace=2.0):
+        self.record_timeout = record_timeout
+        self.page_timeout = page_timeout
+        self.run_timeout = run_timeout
+        self.tick = tick
+        self.cancel_grace = cancel_grace
+        self.paused_total = 0.0
+        self.paused_since = None
+        self.run_started = self._now()
+        self.page_started = self.run_started
+        self.stalls = []
+        # 抓取被提前终止时记录原因（超过整体时限、恢复失败），为 None 表示正常结束
+        self.interrupted = None
+
+    def _now(self):
+        """去掉暂停时间后的单调时钟"""
+        now = time.monotonic()
+        paused = self.paused_total
+        if self.paused_since is not None:
+            paused += now - self.paused_since
+        return now - paused
+
+    def activate(self):
+        global _active_watchdog
+        _active_watchdog = self
+
+    def deactivate(self):
+        global _active_watchdog
+        if _active_watchdog is self:
+            _active_watchdog = None
+
+    def pause(self):
+        if self.paused_since is None:
+            self.paused_since = time.monotonic()
+
+    def resume(self):
+        if self.paused_since is not None:
+            self.paused_total += time.monotonic() - self.paused_since
+            self.paused_since = None
+
+    def start_page(self):
+        self.page_started = self._now()
+
+    def page_elapsed(self) -> float:
+        return self._now() - self.page_started
+
+    def page_expired(self) -> bool:
+        return self.page_elapsed() > self.page_timeout
+
+    def run_elapsed(self) -> float:
+        return self._now() - self.run_started
+
+    def run_expired(self) -> bool:
+        return self.run_elapsed() > self.run_timeout
+
+    def report_stall(self, stage, url, elapsed, limit):
+        """打印并记录卡住的步骤"""
+        stall = {"stage": stage, "url": url, "elapsed": round(elapsed, 1), "limit": limit}
+        self.stalls.append(stall)
+        print(f"[看门狗] 步骤卡住 - 阶段: {stage}, URL: {url}, 已用时: {elapsed:.1f} 秒, 上限: {limit} 秒")
+
+    async def run(self, coro, timeout, stage, page):
+        """在时限内执行 coro，超时则取消并抛出 StallError；取消后仍未结束则抛出 RecoveryError
+
+        每隔 tick 秒检查一次已用时间，暂停期间不计时
+        """
+        started = self._now()
+        task = asyncio.ensure_future(coro)
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=self.tick)
+                if done:
+                    return task.result()
+
+                elapsed = self._now() - started
+                if elapsed > timeout:
+                    # 只等待 cancel_grace 秒，吞掉取消的任务也不会拖住看门狗
+                    task.cancel()
+                    await asyncio.wait({task}, timeout=self.cancel_grace)
+                    self.report_stall(stage, page.url, elapsed, timeout)
+                    if not task.done():
+                        # 任务仍可能在操作同一个页面，不能在这个页面上恢复，交给调用方终止或换新页面
+                        raise RecoveryError(f"{stage} 取消后 {self.cancel_grace} 秒仍未结束，页面无法安全恢复")
+                    if not task.cancelled():
+                        task.exception()
+                    raise StallError(stage, page.url, elapsed, timeout)
+        finally:
+            if not task.done():
+                task.cancel()
+
+
+@contextmanager
+def human_pause():
+    """人工操作期间暂停当前看门狗的计时"""
+    watchdog = _active_watchdog
+    if watchdog is not None:
+        watchdog.pause()
+    try:
+        yield
+    finally:
+        if watchdog is not None:
+            watchdog.resume()
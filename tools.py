@@ -2,9 +2,31 @@
 from langchain.tools import tool
 import asyncio
 from playwright.async_api import async_playwright
-from scraper import setup_browser, set_filters, scrape_page
+from scraper import (
+    setup_browser, open_list_page, apply_common_filters, search_keyword, scrape_page,
+    get_filter_fingerprint, switch_province, OUTPUT_FIELDS,
+    wait_settings, use_fixed_waits, use_human_waits,
+)
+from session_store import format_challenge_stats, reset_challenge_stats
+from stall_watchdog import Watchdog
 import csv
+import glob
+import os
 import re
+import time
+from datetime import datetime
+
+# 回放模式下每次等待的固定秒数，去掉随机等待，使多次回放的行为和耗时可以直接比较
+REPLAY_WAIT_SECONDS = 0.5
+
+# 默认搜索关键词，多个关键词共用同一次筛选设置，结果按机构名称去重合并
+SEARCH_KEYWORDS = ["数据"]
+
+def get_search_keywords() -> list:
+    """读取搜索关键词：环境变量 SCRAPER_KEYWORDS（逗号分隔）优先，未设置时使用 SEARCH_KEYWORDS"""
+    keywords = os.getenv("SCRAPER_KEYWORDS", "").replace('，', ',')
+    keywords = [k.strip() for k in keywords.split(',') if k.strip()]
+    return keywords or SEARCH_KEYWORDS
 
 def clean_province_param(province_param: str) -> str:
     """清理省份参数，移除Agent传递的多余字符
@@ -45,7 +67,7 @@ def social_organization_scraper(province: str) -> str:
         print(f"✅ 开始抓取: '{province_clean}'")
         
         # 执行实际的抓取逻辑
-        result = asyncio.run(execute_scraper(province_clean))
+        result = asyncio.run(execute_scraper(province_clean, get_search_keywords()))
         return result
         
     except Exception as e:
@@ -85,28 +107,30 @@ def batch_social_organization_scraper(provinces: str) -> str:
         total_success = 0
         total_failed = 0
         
-        # 循环处理每个省份
-        for i, province in enumerate(province_list, 1):
-            print(f"\n正在处理第 {i}/{len(province_list)} 个省份: {province}")
-            
-            try:
-                # 执行单个省份的抓取
-                result_text = asyncio.run(execute_scraper(province))
-                
-                # 根据结果文本判断成功与否
-                if "成功" in result_text or "条记录" in result_text:
-                    total_success += 1
-                else:
-                    total_failed += 1
-                    
-            except Exception as e:
-                # 单个省份抓取失败不影响其他省份
-                result_text = f"抓取 {province} 时发生异常: {str(e)}"
+        if os.getenv("SCRAPER_HAR_MODE"):
+            # 录制/回放按省份分别保存，每个省份单独启动浏览器
+            province_results = []
+            for i, province in enumerate(province_list, 1):
+                print(f"\n正在处理第 {i}/{len(province_list)} 个省份: {province}")
+                try:
+                    result_text = asyncio.run(execute_scraper(province, get_search_keywords()))
+                except Exception as e:
+                    result_text = f"抓取 {province} 时发生异常: {str(e)}"
+                province_results.append((province, result_text))
+                print(f"已完成: {i}/{len(province_list)}")
+        else:
+            # 所有省份共用一个已设置好筛选条件的页面，只切换省份
+            province_results = asyncio.run(execute_batch_scraper(province_list, get_search_keywords()))
+        
+        for province, result_text in province_results:
+            # 根据结果文本判断成功与否
+            if "抓取中断" not in result_text and ("成功" in result_text or "条记录" in result_text):
+                total_success += 1
+            else:
                 total_failed += 1
             
             # 记录结果
             results.append(f"## {province} ##\n{result_text}")
-            print(f"已完成: {i}/{len(province_list)}")
         
         # 生成汇总报告
         summary = f"\n批量抓取完成报告\n"
@@ -131,45 +155,265 @@ def get_available_provinces() -> str:
     ])
     return province_list
 
-async def execute_scraper(province: str) -> str:
-    """执行具体的数据抓取逻辑"""
+async def scrape_keywords(page, province, keywords):
+    """在已设置好筛选条件的页面上依次检索各关键词，结果按机构名称去重合并
+    
+    Returns:
+        tuple: (有效数据列表, 多次重试仍失败的数据列表, 各关键词新增有效记录数, 抓取中断原因或 None)
+    """
+    all_valid_data = []
+    failed_items = []
+    seen_names = set()
+    keyword_counts = {}
+    interrupted = None
+    
+    for keyword in keywords:
+        # 只替换关键词并重新检索
+        await search_keyword(page, keyword)
+        
+        # 执行数据抓取
+        print(f"开始抓取页面数据 - 关键词: '{keyword}'")
+        watchdog = Watchdog()
+        keyword_data = await scrape_page(page, province, failed_items, seen_names, watchdog, keyword)
+        keyword_counts[keyword] = len(keyword_data)
+        all_valid_data.extend(keyword_data)
+        
+        # 页面状态已不可信，剩余关键词不再检索
+        if watchdog.interrupted:
+            interrupted = f"关键词 '{keyword}' {watchdog.interrupted}"
+            break
+    
+    # 其他关键词中已完成审核的机构不再计为失败，同一机构只保留一条失败记录
+    failed_items = list({
+        item["name"]: item for item in failed_items if item["name"] not in seen_names
+    }.values())
+    
+    return all_valid_data, failed_items, keyword_counts, interrupted
+
+def find_har_archive(har_dir, province, har_file=None):
+    """查找回放用的录制文件
+    
+    指定 har_file 时使用该文件（可只写文件名，相对 har_dir），否则取该省份最新的一份录制，找不到返回 None
+    """
+    if har_file:
+        har_path = har_file if os.path.exists(har_file) else os.path.join(har_dir, har_file)
+        return har_path if os.path.exists(har_path) else None
+    
+    candidates = glob.glob(os.path.join(har_dir, f"{province}_*.har"))
+    legacy_path = os.path.join(har_dir, f"{province}.har")
+    if os.path.exists(legacy_path):
+        candidates.append(legacy_path)
+    return max(candidates, key=os.path.getmtime) if candidates else None
+
+def har_result_paths(har_path, har_mode):
+    """录制/回放模式下的结果文件路径，与录制文件同目录、同名前缀，返回 (有效数据文件, 失败数据文件)"""
+    stem = os.path.splitext(har_path)[0]
+    return f"{stem}_{har_mode}_valid.csv", f"{stem}_{har_mode}_failed.csv"
+
+def save_results(province, all_valid_data, failed_items, report_note="", har_mode=None, har_path=None, interrupted=None):
+    """保存抓取结果并生成结果说明
+    
+    interrupted 不为空时说明抓取被提前终止，结果只是部分数据，写到单独的 partial 文件，不覆盖之前完整的结果
+    
+    录制/回放模式下结果写到录制文件旁边，文件名带上模式，不覆盖正式结果
+    """
+    if har_mode:
+        valid_filename, failed_filename = har_result_paths(har_path, f"{har_mode}_partial" if interrupted else har_mode)
+    elif interrupted:
+        valid_filename = rf"C:\Users\PC\Desktop\研究生\研1\数据要素市场化推进力指数\2025数据\行业协会\{province}_partial_social_orgs.csv"
+        failed_filename = rf"C:\Users\PC\Desktop\研究生\研1\数据要素市场化推进力指数\2025数据\行业协会\{province}_partial_failed_social_orgs.csv"
+    else:
+        valid_filename = rf"C:\Users\PC\Desktop\研究生\研1\数据要素市场化推进力指数\2025数据\行业协会\{province}_valid_social_orgs.csv"
+        failed_filename = rf"C:\Users\PC\Desktop\研究生\研1\数据要素市场化推进力指数\2025数据\行业协会\{province}_failed_social_orgs.csv"
+    
+    # 多次重试仍失败的数据项单独保存，不与无效数据混在一起
+    failed_note = ""
+    if failed_items:
+        with open(failed_filename, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.DictWriter(f, fieldnames=["name", "province", "date", "attempts", "reason"])
+            writer.writeheader()
+            writer.writerows(failed_items)
+        
+        failed_note = f"\n另有 {len(failed_items)} 条数据详情页多次重试仍失败，已保存到: {failed_filename}"
+    
+    # 处理抓取结果
+    if all_valid_data:
+        filename = valid_filename
+        
+        with open(filename, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.DictWriter(f, fieldnames=OUTPUT_FIELDS)
+            writer.writeheader()
+            writer.writerows(all_valid_data)
+        
+        if interrupted:
+            result = f"抓取中断（{interrupted}），{province} 仅抓取到部分数据，共 {len(all_valid_data)} 条记录。\n"
+        else:
+            result = f"成功抓取 {province} 的社会组织数据，共 {len(all_valid_data)} 条记录。\n"
+        result += f"数据已保存到: {filename}"
+        return result + report_note + failed_note
+    elif interrupted:
+        return f"抓取中断（{interrupted}），在 {province} 没有抓取到有效数据" + report_note + failed_note
+    else:
+        return f"在 {province} 没有找到符合条件的有效数据" + report_note + failed_note
+
+def build_report_note(keywords, keyword_counts, elapsed, waited=0.0):
+    """生成各关键词记录数、滑块统计和耗时说明，waited 为其中主动等待的秒数"""
+    report_note = ""
+    if len(keywords) > 1:
+        report_note = "\n各关键词新增有效记录: " + "，".join(
+            f"{keyword} {count} 条" for keyword, count in keyword_counts.items()
+        )
+    
+    challenge_note = format_challenge_stats()
+    if challenge_note:
+        report_note += "\n" + challenge_note
+    
+    report_note += f"\n抓取耗时: {elapsed:.1f} 秒（其中等待 {waited:.1f} 秒，去除等待后 {elapsed - waited:.1f} 秒）"
+    return report_note
+
+async def execute_scraper(province: str, keywords: list = None, har_mode: str = None, har_file: str = None) -> str:
+    """执行具体的数据抓取逻辑
+    
+    多个关键词时只设置一次筛选条件，之后仅替换搜索框内容重新检索。
+    har_mode 为 "record" 时录制真实运行的网络流量，为 "replay" 时从录制文件回放、不访问网络，
+    回放时页面数据固定不变，可用于对比抓取行为和耗时。未指定时读取环境变量 SCRAPER_HAR_MODE。
+    每次录制写到 SCRAPER_HAR_DIR（默认 har）下新的 {省份}_{时间}.har，不覆盖旧录制；
+    回放时使用 har_file（或环境变量 SCRAPER_HAR_FILE）指定的录制，未指定则取该省份最新的一份
+    """
+    keywords = keywords or get_search_keywords()
+    har_mode = har_mode or os.getenv("SCRAPER_HAR_MODE") or None
+    har_path = None
+    if har_mode:
+        har_dir = os.getenv("SCRAPER_HAR_DIR", "har")
+        if har_mode == "record":
+            os.makedirs(har_dir, exist_ok=True)
+            har_path = os.path.join(har_dir, f"{province}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.har")
+        elif har_mode == "replay":
+            har_path = find_har_archive(har_dir, province, har_file or os.getenv("SCRAPER_HAR_FILE"))
+            if not har_path:
+                return f"回放失败：在 {har_dir} 中没有找到 {province} 的录制文件"
+    
     try:
         #print(f"开始执行数据抓取 - 省份: '{province}'")
         
+        # 滑块统计只统计本次运行
+        reset_challenge_stats()
+        
+        # 回放时使用固定等待，结束后恢复
+        if har_mode == "replay":
+            use_fixed_waits(REPLAY_WAIT_SECONDS)
+        
         # 启动浏览器
         async with async_playwright() as p:
-            browser, page = await setup_browser(p)
+            browser, page = await setup_browser(p, har_mode=har_mode, har_path=har_path)
             
             try:
-                keyword = "数据"
-                print(f"设置筛选条件 - 省份: '{province}', 关键词: '{keyword}'")
+                start_time = time.perf_counter()
+                waited_start = wait_settings["waited"]
+                print(f"设置筛选条件 - 省份: '{province}', 关键词: {keywords}")
                 
-                # 设置筛选条件
-                await set_filters(page, province, keyword)
+                # 设置与关键词无关的筛选条件，只需一次
+                await apply_common_filters(page, province)
                 
-                # 执行数据抓取
-                print("开始抓取页面数据...")
-                all_valid_data = await scrape_page(page, province)
+                all_valid_data, failed_items, keyword_counts, interrupted = await scrape_keywords(page, province, keywords)
                 
-                # 处理抓取结果
-                if all_valid_data:
-                    filename = rf"C:\Users\PC\Desktop\研究生\研1\数据要素市场化推进力指数\2025数据\行业协会\{province}_valid_social_orgs.csv"
-                    
-                    with open(filename, "w", newline="", encoding="utf-8-sig") as f:
-                        writer = csv.DictWriter(f, fieldnames=["name", "province", "date"])
-                        writer.writeheader()
-                        writer.writerows(all_valid_data)
-                    
-                    result = f"成功抓取 {province} 的社会组织数据，共 {len(all_valid_data)} 条记录。\n"
-                    result += f"数据已保存到: {filename}"
-                    return result
-                else:
-                    return f"在 {province} 没有找到符合条件的有效数据"
+                report_note = build_report_note(
+                    keywords, keyword_counts, time.perf_counter() - start_time, wait_settings["waited"] - waited_start
+                )
+                if har_mode:
+                    report_note += f"（{'录制' if har_mode == 'record' else '回放'}: {har_path}）"
+                
+                return save_results(
+                    province, all_valid_data, failed_items, report_note, har_mode, har_path, interrupted
+                )
                     
             except Exception as e:
                 return f"抓取 {province} 数据时出错: {str(e)}"
             finally:
+                # 先关闭上下文，录制模式下 HAR 文件在此时写入
+                await page.context.close()
                 await browser.close()
                 
     except Exception as e:
-        return f"浏览器初始化失败: {str(e)}"
\ No newline at end of file
+        return f"浏览器初始化失败: {str(e)}"
+    finally:
+        use_human_waits()
+
+async def execute_batch_scraper(provinces: list, keywords: list = None) -> list:
+    """在同一个浏览器页面上依次抓取多个省份
+    
+    只在开始时设置一次全部筛选条件，之后每个省份只切换省份下拉框。切换后通过筛选条件指纹
+    确认其他条件仍然有效，否则重新打开列表页完整设置一次
+    
+    Returns:
+        list: [(省份, 结果说明), ...]
+    """
+    keywords = keywords or get_search_keywords()
+    results = []
+    
+    # 滑块统计只统计本次批量运行，各省份报告显示截至该省份的累计值
+    reset_challenge_stats()
+    
+    try:
+        async with async_playwright() as p:
+            browser, page = await setup_browser(p)
+            
+            try:
+                fingerprint = None
+                for i, province in enumerate(provinces, 1):
+                    print(f"\n正在处理第 {i}/{len(provinces)} 个省份: {province}")
+                    start_time = time.perf_counter()
+                    waited_start = wait_settings["waited"]
+                    
+                    try:
+                        if fingerprint is None or not await switch_province(page, province, fingerprint):
+                            if fingerprint is not None:
+                                print("重新打开列表页并设置全部筛选条件")
+                                await open_list_page(page)
+                            await apply_common_filters(page, province)
+                            fingerprint = await get_filter_fingerprint(page)
+                        
+                        all_valid_data, failed_items, keyword_counts, interrupted = await scrape_keywords(
+                            page, province, keywords
+                        )
+                        
+                        report_note = build_report_note(
+                            keywords, keyword_counts, time.perf_counter() - start_time,
+                            wait_settings["waited"] - waited_start
+                        )
+                        result_text = save_results(
+                            province, all_valid_data, failed_items, report_note, interrupted=interrupted
+                        )
+                        
+                        # 中断后页面上可能仍有未结束的任务，关闭旧页面让它失效，
+                        # 下一个省份在新页面上重新打开列表页并设置全部筛选条件
+                        if interrupted:
+                            fingerprint = None
+                            stale_page = page
+                            page = await stale_page.context.new_page()
+                            await stale_page.close()
+                            await open_list_page(page)
+                    except Exception as e:
+                        # 单个省份抓取失败不影响其他省份，下一个省份重新设置筛选条件
+                        result_text = f"抓取 {province} 数据时出错: {str(e)}"
+                        fingerprint = None
+                        try:
+                            await open_list_page(page)
+                        except Exception as reload_error:
+                            print(f"重新打开列表页失败: {reload_error}")
+                    
+                    results.append((province, result_text))
+                    print(f"已完成: {i}/{len(provinces)}")
+                    
+            finally:
+                await page.context.close()
+                await browser.close()
+                
+    except Exception as e:
+        # 浏览器异常时，尚未处理的省份全部记为失败
+        done = {province for province, _ in results}
+        results.extend(
+            (province, f"浏览器异常，未能抓取: {str(e)}") for province in provinces if province not in done
+        )
+    
+    return results